@@ -1,15 +1,19 @@
+from __future__ import annotations
+
 import io
 import re
+import warnings
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
+from zoneinfo import ZoneInfo
 
-import pandas as pd
 import streamlit as st
-import pytz
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Side, PatternFill, Font
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.table import Table, TableStyleInfo  # Excel Table for dynamic banding
+
+# pandas/numpy/openpyxl are imported inside the functions that use them, so the page
+# header and uploader paint before those imports run on a cold start.
+if TYPE_CHECKING:
+    import pandas as pd
 
 # ----------------------------
 
@@ -40,136 +44,228 @@ up = st.file_uploader("Upload *10415*.xlsx", type=["xlsx"], key="qf")
 # ----------------------------
 # Colors & Styles
 # ----------------------------
-RED   = "C00000"
-GREEN = "008000"
-BLACK = "000000"
+# 8-char ARGB: openpyxl pads 6-char colors with a 00 (transparent) alpha
+RED   = "FFC00000"
+GREEN = "FF008000"
+BLACK = "FF000000"
 
-THIN = Side(style="thin",   color=BLACK)
-MED  = Side(style="medium", color=BLACK)
+# ----------------------------
+# Constants
+# ----------------------------
+CENTRAL_TZ = ZoneInfo("America/Chicago")
+
+# Report columns — Center immediately after Last Name (if present)
+REPORT_COLUMNS = [
+    "PID", "First Name", "Last Name", "Center", "Class",
+    "Authorization Date", "Disability Identified", "Primary Disability",
+]
+HEADER_SCAN_ROWS = 50  # the 10415 header always sits within the first few rows
+_CHILD_HDR = re.compile(r"authorization:\s*regarding my child", re.I)  # header marker + rename rule
+
+# 10415 header variants -> canonical column names (first match wins)
+_RENAME_RULES = [
+    (_CHILD_HDR,                                               "Child Name"),
+    (re.compile(r"authorization:\s*date", re.I),               "Authorization Date"),
+    (re.compile(r"IEP/IFSP\s*Dis:Identified", re.I),           "Disability Identified"),
+    (re.compile(r"primary\s*disability", re.I),                "Primary Disability"),
+    (re.compile(r"\bcenter name\b|\bcenter\b", re.I),          "Center"),
+    (re.compile(r"\bclass name\b|\bclass\b", re.I),            "Class"),
+    (re.compile(r"\bparticipant pid\b|\bpid\b", re.I),         "PID"),
+    (re.compile(r"\bfirst name\b", re.I),                      "First Name"),
+    (re.compile(r"\blast name\b", re.I),                       "Last Name"),
+]
 
 # ----------------------------
 # Helpers
 # ----------------------------
+def _read_raw(file) -> pd.DataFrame:
+    """Read the first sheet with no header row, parsed once by the Rust calamine engine."""
+    import pandas as pd
+
+    return pd.read_excel(file, header=None, engine="calamine")
+
 def _detect_header_row(raw_df: pd.DataFrame) -> int:
     """Detect header row by looking at first column content."""
-    first_col = raw_df.iloc[:, 0].astype(str).str.strip().str.lower()
-    if first_col.str.contains(r"authorization:\s*regarding my child", na=False).any():
-        return first_col.str.contains(r"authorization:\s*regarding my child", na=False).idxmax()
-    if first_col.str.contains("participant pid", na=False).any():
-        return first_col.str.contains("participant pid", na=False).idxmax()
+    first_col = raw_df.iloc[:HEADER_SCAN_ROWS, 0].astype(str).str.strip().str.lower()
+    child_hdr = first_col.str.contains(_CHILD_HDR, na=False)
+    if child_hdr.any():
+        return int(child_hdr.idxmax())
+    pid_hdr = first_col.str.contains("participant pid", na=False, regex=False)
+    if pid_hdr.any():
+        return int(pid_hdr.idxmax())
     # Fallback: densest row
-    return raw_df.notna().sum(axis=1).idxmax()
+    return int(raw_df.notna().sum(axis=1).idxmax())
+
+def _frame_from_raw(raw_df: pd.DataFrame, hdr_row: int) -> pd.DataFrame:
+    """Non-empty rows below the header under canonical names, projected to the report's columns."""
+    import pandas as pd
+
+    names = _rename_columns(["" if pd.isna(v) else v for v in raw_df.iloc[hdr_row]])
+    keep = [j for j, name in enumerate(names) if name in REPORT_COLUMNS or name == "Child Name"]
+    # Drop blank rows across all columns so rows with data only in unreported columns still appear
+    df = raw_df.iloc[hdr_row + 1:].dropna(how="all").iloc[:, keep]
+    df = df.set_axis([names[j] for j in keep], axis=1).infer_objects()
+
+    # Match read_excel(header=...) typing: a text column whose every value parses as a
+    # number (e.g. PID "00103") becomes numeric; anything else is left as-is.
+    for j in range(df.shape[1]):
+        col = df.iloc[:, j]
+        if col.dtype == object or pd.api.types.is_string_dtype(col):
+            try:
+                df.isetitem(j, pd.to_numeric(col))
+            except (ValueError, TypeError):
+                pass
+    return df
 
 def _rename_columns(cols):
     """Standardize 10415 variants to canonical names."""
-    mapping = {}
-    for c in cols:
-        s = str(c).strip()
-        if re.search(r"authorization:\s*regarding my child", s, re.I):
-            mapping[c] = "Child Name"
-        elif re.search(r"authorization:\s*date", s, re.I):
-            mapping[c] = "Authorization Date"
-        elif re.search(r"IEP/IFSP\s*Dis:Identified", s, re.I):
-            mapping[c] = "Disability Identified"
-        elif re.search(r"primary\s*disability", s, re.I):
-            mapping[c] = "Primary Disability"
-        elif re.search(r"\bcenter name\b|\bcenter\b", s, re.I):
-            mapping[c] = "Center"
-        elif re.search(r"\bclass name\b|\bclass\b", s, re.I):
-            mapping[c] = "Class"
-        elif re.search(r"\bparticipant pid\b|\bpid\b", s, re.I):
-            mapping[c] = "PID"
-        elif re.search(r"\bfirst name\b", s, re.I):
-            mapping[c] = "First Name"
-        elif re.search(r"\blast name\b", s, re.I):
-            mapping[c] = "Last Name"
-        else:
-            mapping[c] = s
-    return [mapping[c] for c in cols]
+    stripped = (str(c).strip() for c in cols)
+    return [next((name for pat, name in _RENAME_RULES if pat.search(s)), s) for s in stripped]
 
 def _split_child_name(df: pd.DataFrame) -> pd.DataFrame:
     """If only 'Child Name' exists, split it into First/Last."""
     if "Child Name" in df.columns:
-        def split_name(full):
-            if pd.isna(full):
-                return pd.Series({"First Name": "", "Last Name": ""})
-            parts = str(full).split()
-            if len(parts) == 1:
-                return pd.Series({"First Name": parts[0], "Last Name": ""})
-            return pd.Series({"First Name": " ".join(parts[:-1]), "Last Name": parts[-1]})
-        name_split = df["Child Name"].apply(split_name)
+        # Split on any whitespace (incl. NBSP/tabs); last word is the last name and
+        # everything before it the first name; a single word is a first name only
+        words = df["Child Name"].astype("string").fillna("").str.split()
+        multi = words.str.len() > 1
+        name_split = {
+            "First Name": words.str[:-1].str.join(" ").where(multi, words.str[0]).fillna(""),
+            "Last Name":  words.str[-1].where(multi, "").fillna(""),
+        }
         for col in ["First Name", "Last Name"]:
             if col not in df.columns:
                 df[col] = name_split[col]
     return df
 
-def _autosize(ws, header_row: int):
-    """Autosize columns based on header + data length (skip merged title rows)."""
-    for col in range(1, ws.max_column + 1):
-        letter = get_column_letter(col)
-        max_len = 0
-        hv = ws.cell(row=header_row, column=col).value
-        if hv is not None:
-            max_len = len(str(hv))
-        for r in range(header_row + 1, ws.max_row + 1):
-            v = ws.cell(row=r, column=col).value
-            if v is None:
-                continue
-            max_len = max(max_len, len(str(v)))
-        ws.column_dimensions[letter].width = min(max_len + 3, 48)
-
-def _build_with_table(df: pd.DataFrame) -> bytes:
+def _autosize(ws, df: pd.DataFrame):
+    """Size columns from header + data length (must run before rows are appended in write-only mode)."""
+    from openpyxl.utils import get_column_letter
+
+    for j, col in enumerate(df.columns, start=1):
+        lens = df.iloc[:, j - 1].dropna().astype(str).str.len()
+        max_len = max(len(str(col)), int(lens.max()) if len(lens) else 0)
+        ws.column_dimensions[get_column_letter(j)].width = min(max_len + 3, 48)
+
+def _build_with_table(df: pd.DataFrame, now: datetime) -> bytes:
     """Build workbook with an Excel Table (gray/white dynamic banding + filters on header)."""
-    # Normalize dates to strings
+    import numpy as np
+    import pandas as pd
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Side, Font, NamedStyle
+    from openpyxl.styles.fonts import DEFAULT_FONT
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.filters import AutoFilter
+    from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo  # Excel Table for dynamic banding
+
+    # Normalize dates to strings; missing dates become a ✗ and the mask drives their styling
+    date_blank = None
     if "Authorization Date" in df.columns:
         dt = pd.to_datetime(df["Authorization Date"], errors="coerce")
-        df["Authorization Date"] = dt.dt.strftime("%m/%d/%Y").fillna("")
+        date_blank = dt.isna().to_numpy()
+        df["Authorization Date"] = np.where(date_blank, "✗", dt.dt.strftime("%m/%d/%Y"))
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Authorizations"
+    # Write-only workbook: rows are streamed to XML as they are appended, so column
+    # widths and freeze panes must be set before the first append.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Authorizations")
 
     # Title rows (2–3), Header row (4), Data row start (5)
     header_row = 4
     data_row0  = header_row + 1
     total_cols = max(1, df.shape[1])
+    max_row    = header_row + len(df)
+    last_col   = get_column_letter(total_cols)
+
+    # Shared styles — one instance per look, reused by every cell
+    center     = Alignment(horizontal="center", vertical="center")
+    title_font = Font(bold=True, size=14)
+    red_x_font = Font(bold=True, color=RED)
+    green_font = Font(color=GREEN)
+    thin       = Side(style="thin",   color=BLACK)
+    med        = Side(style="medium", color=BLACK)
+
+    # Interior cells share the workbook-level "thin_grid" named style; only cells on the
+    # table's outer edge get an explicit medium/thin outline variant, all built up front.
+    borders = {
+        (top, bottom, left, right): Border(
+            left=med if left else thin, right=med if right else thin,
+            top=med if top else thin, bottom=med if bottom else thin,
+        )
+        for top in (False, True) for bottom in (False, True)
+        for left in (False, True) for right in (False, True)
+    }
+    wb.add_named_style(
+        NamedStyle(name="thin_grid", font=DEFAULT_FONT, border=borders[(False, False, False, False)])
+    )
+
+    # Autosize from the DataFrame; freeze below the header so headers stay visible
+    _autosize(ws, df)
+    ws.freeze_panes = f"A{data_row0}"
 
     # Title and subtitle
-    ws.merge_cells(start_row=2, start_column=1, end_row=2, end_column=total_cols)
-    ws.merge_cells(start_row=3, start_column=1, end_row=3, end_column=total_cols)
+    ws.append([])
+    tcell = WriteOnlyCell(ws, value="Hidalgo County Head Start Program")
+    tcell.font = title_font
+    tcell.alignment = center
+    ws.append([tcell])
 
-    tcell = ws.cell(row=2, column=1, value="Hidalgo County Head Start Program")
-    tcell.font = Font(bold=True, size=14)
-    tcell.alignment = Alignment(horizontal="center", vertical="center")
+    now_str = now.strftime("%m/%d/%y %I:%M %p CT")
+    scell = WriteOnlyCell(ws, value=f"Disability Authorizations — 2025–2026 as of ({now_str})")
+    scell.alignment = center
+    ws.append([scell])
 
-    tz = pytz.timezone("America/Chicago")
-    now_str = datetime.now(tz).strftime("%m/%d/%y %I:%M %p CT")
-    scell = ws.cell(row=3, column=1, value=f"Disability Authorizations — 2025–2026 as of ({now_str})")
-    scell.alignment = Alignment(horizontal="center", vertical="center")
+    ws.merged_cells.add(f"A2:{last_col}2")
+    ws.merged_cells.add(f"A3:{last_col}3")
 
     # Header cells (table style will color them; keep centered)
+    header = []
     for j, col in enumerate(df.columns, start=1):
-        c = ws.cell(row=header_row, column=j, value=col)
-        c.alignment = Alignment(horizontal="center", vertical="center")
-
-    # Data + date styling
-    for i, row in enumerate(df.itertuples(index=False), start=data_row0):
-        for j, val in enumerate(row, start=1):
-            c = ws.cell(row=i, column=j, value=val)
-            if df.columns[j - 1] == "Authorization Date":
-                if (val is None) or (str(val).strip() == ""):
-                    c.value = "✗"
-                    c.font = Font(bold=True, color=RED)
-                    c.alignment = Alignment(horizontal="center", vertical="center")
-                else:
-                    c.font = Font(color=GREEN)
-
-    max_row = ws.max_row
-    max_col = ws.max_column
-
-    # Excel Table: gray/white banding + header filters
-    table_ref = f"A{header_row}:{get_column_letter(max_col)}{max_row}"
+        c = WriteOnlyCell(ws, value=col)
+        c.alignment = center
+        c.border = borders[(True, header_row == max_row, j == 1, j == total_cols)]
+        header.append(c)
+    ws.append(header)
+
+    # Data + date styling: plain row tuples (no 2-D object copy of the frame), column roles
+    # resolved up front
+    n_rows, n_cols = df.shape
+    date_j = list(df.columns).index("Authorization Date") if "Authorization Date" in df.columns else -1
+
+    # Per-column outline for a middle row and for the bottom row (None = "thin_grid")
+    mid_borders = [
+        borders[(False, False, j == 0, j == n_cols - 1)] if j in (0, n_cols - 1) else None
+        for j in range(n_cols)
+    ]
+    bottom_borders = [borders[(False, True, j == 0, j == n_cols - 1)] for j in range(n_cols)]
+
+    for i, row in enumerate(df.itertuples(index=False, name=None)):
+        row_borders = bottom_borders if i == n_rows - 1 else mid_borders
+        cells = []
+        for j, val in enumerate(row):
+            c = WriteOnlyCell(ws, value=val)
+            b = row_borders[j]
+            if b is None:
+                c.style = "thin_grid"
+            else:
+                c.border = b
+            cells.append(c)
+        if date_j >= 0:
+            c = cells[date_j]
+            if date_blank[i]:
+                c.font = red_x_font
+                c.alignment = center
+            else:
+                c.font = green_font
+        ws.append(cells)
+
+    # Excel Table: gray/white banding + header filters. Write-only sheets can't read
+    # the header cells back, so the table columns are declared explicitly.
+    table_ref = f"A{header_row}:{last_col}{max_row}"
     table = Table(displayName="AuthorizationsTable", ref=table_ref)
+    table.tableColumns = [TableColumn(id=j, name=str(col)) for j, col in enumerate(df.columns, start=1)]
+    table.autoFilter = AutoFilter(ref=table_ref)
     table.tableStyleInfo = TableStyleInfo(
         name="TableStyleMedium2",     # <-- gray + white banding
         showFirstColumn=False,
@@ -177,35 +273,32 @@ def _build_with_table(df: pd.DataFrame) -> bytes:
         showRowStripes=True,
         showColumnStripes=False,
     )
-    ws.add_table(table)
-
-    # Freeze below the header so headers stay visible
-    ws.freeze_panes = f"A{data_row0}"
-
-    # Optional: outside outline around the table
-    for r in range(header_row, max_row + 1):
-        for c in range(1, max_col + 1):
-            cell = ws.cell(row=r, column=c)
-            cell.border = Border(left=THIN, right=THIN, top=THIN, bottom=THIN)
-    for c in range(1, max_col + 1):
-        ws.cell(row=header_row, column=c).border = Border(
-            left=MED if c == 1 else THIN, right=MED if c == max_col else THIN, top=MED, bottom=THIN
-        )
-        ws.cell(row=max_row, column=c).border = Border(
-            left=MED if c == 1 else THIN, right=MED if c == max_col else THIN, top=THIN, bottom=MED
-        )
-    for r in range(header_row, max_row + 1):
-        ws.cell(row=r, column=1).border       = Border(left=MED, right=THIN, top=THIN, bottom=THIN)
-        ws.cell(row=r, column=max_col).border = Border(left=THIN, right=MED, top=THIN, bottom=THIN)
-
-    # Autosize from header row down
-    _autosize(ws, header_row)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="In write-only mode you must add table columns manually")
+        ws.add_table(table)
 
     bio = io.BytesIO()
     wb.save(bio)
     bio.seek(0)
     return bio.getvalue()
 
+@st.cache_data(show_spinner=False, ttl=600, max_entries=16)  # 10 minutes; a str ttl would import pandas
+def _process(file_bytes: bytes):
+    """Parse, clean and format one 10415 export -> (workbook, download file stem), cached per upload."""
+    # Header detection & normalization — the upload is parsed once
+    raw = _read_raw(io.BytesIO(file_bytes))
+    hdr_row = _detect_header_row(raw)
+    df = _frame_from_raw(raw, hdr_row)
+    del raw  # full-width sheet is no longer needed; free it before the workbook build
+    df = _split_child_name(df)
+
+    existing = [c for c in REPORT_COLUMNS if c in df.columns]
+    df = df[existing]
+
+    # One timestamp for both the subtitle and the file name, so they always agree
+    now = datetime.now(CENTRAL_TZ)
+    return _build_with_table(df, now), f"HCHSP_DisabilityAuthorizations_{now:%Y%m%d_%H%M%S}"
+
 # ----------------------------
 # Main
 # ----------------------------
@@ -215,29 +308,13 @@ if up:
         st.error("Please upload the correct file: filename must include **10415**.")
         st.stop()
 
-    # Header detection & normalization
-    raw = pd.read_excel(up, header=None)
-    hdr_row = _detect_header_row(raw)
-
-    df = pd.read_excel(up, header=hdr_row).dropna(how="all")
-    df.columns = _rename_columns(df.columns)
-    df = _split_child_name(df)
-
-    # Column order: Center immediately after Last Name (if present)
-    preferred = [
-        "PID", "First Name", "Last Name", "Center", "Class",
-        "Authorization Date", "Disability Identified", "Primary Disability",
-    ]
-    existing = [c for c in preferred if c in df.columns]
-    df = df[existing]
-
-    # Build and download
-    xlsx = _build_with_table(df)
+    # Build and download (cached on the upload's bytes, so widget reruns skip the work)
+    xlsx, file_stem = _process(up.getvalue())
     st.success("File processed successfully. Click below to download.")
     st.download_button(
         "⬇️ Download Disability Authorizations (.xlsx)",
         data=xlsx,
-        file_name=f"HCHSP_DisabilityAuthorizations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        file_name=f"{file_stem}.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
 else: